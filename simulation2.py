@@ -6,11 +6,20 @@ import time
 import sys
 import json
 import argparse
+import copy
+from functools import lru_cache
 
 def print_progress(iteration, total, prefix='', suffix='', decimals=1, bar_length=50):
     """
     Call in a loop to create a progress bar in the console.
+    
+    Redraws at most every 0.1 s so tight loops are not slowed down by console
+    writes; the first and final iterations are always drawn.
     """
+    now = time.monotonic()
+    if iteration not in (1, total) and now - print_progress._last_update < 0.1:
+        return
+    print_progress._last_update = now
     str_format = "{0:." + str(decimals) + "f}"
     percents = str_format.format(100 * (iteration / float(total)))
     filled_length = int(round(bar_length * iteration / float(total)))
@@ -21,6 +30,86 @@ def print_progress(iteration, total, prefix='', suffix='', decimals=1, bar_lengt
     if iteration == total:
         sys.stdout.write('\n')
 
+print_progress._last_update = 0.0
+
+@lru_cache(maxsize=8)
+def _read_config_file(config_path, mtime):
+    """
+    Read and parse a configuration file.
+    
+    Cached on (config_path, mtime) so repeated loads of an unchanged file
+    skip the disk read and JSON parsing. Callers must not mutate the result.
+    """
+    with open(config_path, 'r') as f:
+        return json.load(f)
+
+def read_config_file(config_path):
+    """
+    Read a configuration file, reusing the parsed result while the file is unchanged.
+    
+    Parameters:
+    -----------
+    config_path : str
+        Path to the configuration file
+    
+    Returns:
+    --------
+    dict
+        Configuration dictionary (a private copy the caller may modify)
+    
+    Raises:
+    -------
+    FileNotFoundError
+        If the configuration file does not exist
+    """
+    # One stat both checks that the file exists and keys the parse cache
+    mtime = os.stat(config_path).st_mtime
+    # Hand out a copy, the cached dict is shared between calls
+    return copy.deepcopy(_read_config_file(config_path, mtime))
+
+@lru_cache(maxsize=4)
+def _read_input_sheets(input_file, mtime, sheet_names):
+    """
+    Parse the given sheets of an input workbook, opening the file only once.
+    
+    Cached on (input_file, mtime, sheet_names) so repeated runs on an unchanged
+    workbook skip the Excel parsing. Callers must not mutate the result.
+    """
+    # Prefer the Rust-based calamine reader (pandas >= 2.2 with python-calamine
+    # installed) and fall back to pandas' default engine when it is not available
+    try:
+        input_xls = pd.ExcelFile(input_file, engine='calamine')
+    except (ImportError, ValueError):
+        input_xls = pd.ExcelFile(input_file)
+    with input_xls:
+        return {name: input_xls.parse(name) for name in sheet_names}
+
+def read_input_sheets(input_file, sheet_names):
+    """
+    Read sheets from an input workbook, reusing the parsed data while the file is unchanged.
+    
+    Parameters:
+    -----------
+    input_file : str
+        Path to the input Excel workbook
+    sheet_names : tuple of str
+        Names of the sheets to read
+    
+    Returns:
+    --------
+    dict
+        Sheet name to DataFrame (private copies the caller may modify)
+    
+    Raises:
+    -------
+    FileNotFoundError
+        If the input file does not exist
+    """
+    # One stat both checks that the file exists and keys the parse cache
+    mtime = os.stat(input_file).st_mtime
+    # Hand out copies, the cached frames are shared between calls
+    return {name: sheet.copy() for name, sheet in _read_input_sheets(input_file, mtime, tuple(sheet_names)).items()}
+
 def load_config(config_path="config.json"):
     """
     Load configuration from JSON file.
@@ -36,28 +125,26 @@ def load_config(config_path="config.json"):
         Configuration dictionary
     """
     try:
-        if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            print(f"Loaded configuration from {config_path}")
-            return config
-        else:
-            print(f"Configuration file {config_path} not found. Using default settings.")
-            return {
-                "simulation": {
-                    "input_file": "Input.xlsx",
-                    "output_file": "Output.xlsx",
-                    "detailed_output_file": "DetailedOutput.xlsx",
-                    "shock_scenario": {
-                        "scenario_type": "Percentage Change", # Added default
-                        "s1_change": -0.1,
-                        "s2_change": 0.1,
-                        "s3_change": 0.0,
-                        "s1_reallocation_percentage": 0.5 # Added default
-                    },
-                    "variables_to_exclude": []
-                }
+        config = read_config_file(config_path)
+        print(f"Loaded configuration from {config_path}")
+        return config
+    except FileNotFoundError:
+        print(f"Configuration file {config_path} not found. Using default settings.")
+        return {
+            "simulation": {
+                "input_file": "Input.xlsx",
+                "output_file": "Output.xlsx",
+                "detailed_output_file": "DetailedOutput.xlsx",
+                "shock_scenario": {
+                    "scenario_type": "Percentage Change", # Added default
+                    "s1_change": -0.1,
+                    "s2_change": 0.1,
+                    "s3_change": 0.0,
+                    "s1_reallocation_percentage": 0.5 # Added default
+                },
+                "variables_to_exclude": []
             }
+        }
     except Exception as e:
         print(f"Error loading configuration: {str(e)}. Using default settings.")
         return {
@@ -117,27 +204,30 @@ def run_simulation(config=None):
     
     try:
         print(f"Loading data from {input_file}...")
-        parameters_df = pd.read_excel(input_file, sheet_name='parameters')
-        data_df = pd.read_excel(input_file, sheet_name='data_2024') # This is the main df for baseline
+        # Read every needed sheet in one pass over the workbook
+        use_2012_values = shock_scenario.get("scenario_type") == "use_2012_values"
+        sheet_names = ('parameters', 'data_2024', 'data_2012') if use_2012_values else ('parameters', 'data_2024')
+        if use_2012_values:
+            print("Loading data_2012 sheet for 'Use 2012 Values' scenario...")
+        input_sheets = read_input_sheets(input_file, sheet_names)
+        parameters_df = input_sheets['parameters']
+        data_df = input_sheets['data_2024'] # This is the main df for baseline
 
         data_2012_df = None
-        if shock_scenario.get("scenario_type") == "use_2012_values":
+        if use_2012_values:
             try:
-                print("Loading data_2012 sheet for 'Use 2012 Values' scenario...")
-                data_2012_df = pd.read_excel(input_file, sheet_name='data_2012')
+                data_2012_df = input_sheets['data_2012']
                 print(f"Successfully loaded 'data_2012' sheet. Columns: {data_2012_df.columns.tolist()}")
                 print(f"data_2012_df head:\n{data_2012_df.head()}")
-                required_cols_2012 = ['age', 'sex', 's1', 's2', 's3']
-                if not all(col in data_2012_df.columns for col in required_cols_2012):
-                    raise ValueError(f"data_2012 sheet is missing one of required columns: {required_cols_2012}")
-            except FileNotFoundError:
-                print(f"Error: Input file {input_file} not found when trying to load data_2012 sheet.")
-                raise
+                required_cols_2012 = {'age', 'sex', 's1', 's2', 's3'}
+                missing_cols_2012 = required_cols_2012 - set(data_2012_df.columns)
+                if missing_cols_2012:
+                    raise ValueError(f"data_2012 sheet is missing required columns: {sorted(missing_cols_2012)}")
             except Exception as e:
                 print(f"Error loading or validating data_2012 sheet: {str(e)}")
                 raise
         
-        df = data_df.copy()
+        df = data_df  # Already a private copy of the cached sheet, so no defensive copy is needed
         
         # Identify the columns that are NOT baseline variables
         non_baseline_cols = {"year", "age", "sex", "s1", "s2", "s3", "population"}
@@ -161,7 +251,7 @@ def run_simulation(config=None):
         print(f"Processing {len(baseline_vars)} baseline variables: {', '.join(baseline_vars)}")
         
         # Check if any of the required baseline variables are missing
-        missing_vars = [var for var in parameters_df['variable'] if var not in df.columns]
+        missing_vars = parameters_df.loc[~parameters_df['variable'].isin(df.columns), 'variable'].tolist()
         if missing_vars:
             raise ValueError(f"Missing baseline variables in data_2024 sheet: {missing_vars}")
         
@@ -173,46 +263,51 @@ def run_simulation(config=None):
         
         # Create a dictionary to store all new columns, which we'll add to the dataframe at once
         new_columns = {}
-        new_columns["population_20_64"] = df.apply(
-            lambda row: row["population"] if row["age"] in age_groups_20_64 else 0,
-            axis=1
-        )
+        new_columns["population_20_64"] = df["population"].where(df["age"].isin(age_groups_20_64), 0)
         
         # Identify age-related columns in parameters
         age_cols = [col for col in parameters_df.columns if col.startswith("age_")]
         
+        # Sex masks are the same for every variable, so build them once
+        is_men = (df["sex"] == "M").to_numpy()
+        is_women = (df["sex"] == "K").to_numpy()
+        # Integer-code the age groups once; the age masks are then a lookup over the
+        # few distinct groups instead of string comparisons on every row.
+        # Missing ages get code -1, which picks the trailing False of the lookup table.
+        age_codes, age_levels = pd.factorize(df["age"])
+        
         print("Applying demographic ratios...")
-        # Process ratios per age and sex (prepare all columns at once)
-        for i, (_, row) in enumerate(parameters_df.iterrows()):
-            variable = row["variable"]
-            # Skip if this variable is not in our baseline_vars
-            if variable not in baseline_vars:
-                continue
-                
-            valid_ages = row[age_cols].dropna().tolist()
-            col_s_n = f"{variable}_s_n"
-            col_w_s = f"{variable}_w_s"
-            
-            # Default values
-            new_columns[col_s_n] = pd.Series(1.0, index=df.index)
-            new_columns[col_w_s] = pd.Series(1.0, index=df.index)
-            
-            # Set values for specific demographics
-            men_mask = (df["sex"] == "M") & (df["age"].isin(valid_ages))
-            women_mask = (df["sex"] == "K") & (df["age"].isin(valid_ages))
-            
-            # Update values based on masks
-            new_columns[col_s_n].loc[men_mask] = row["s_n_men"]
-            new_columns[col_s_n].loc[women_mask] = row["s_n_women"]
-            new_columns[col_w_s].loc[men_mask] = row["w_s_men"]
-            new_columns[col_w_s].loc[women_mask] = row["w_s_women"]
-            
-            # Show progress
-            print_progress(i + 1, len(parameters_df), prefix='Progress:', suffix='Complete', bar_length=50)
+        # Build every variable's ratios at once as (rows x variables) matrices
+        ratio_params = parameters_df[parameters_df["variable"].isin(baseline_vars)]
+        # Age-validity table: which distinct age groups each variable applies to,
+        # plus a trailing False column for missing ages (code -1)
+        age_valid = (
+            ratio_params[age_cols].to_numpy(dtype=object)[:, :, None]
+            == np.asarray(age_levels, dtype=object)[None, None, :]
+        ).any(axis=1)
+        age_valid = np.hstack([age_valid, np.zeros((len(ratio_params), 1), dtype=bool)])
+        age_mask = age_valid[:, age_codes].T
+        men_mask = is_men[:, None] & age_mask
+        women_mask = is_women[:, None] & age_mask
+        
+        # Pick the men/women ratio where the masks apply, 1.0 everywhere else
+        s_n = np.select(
+            [men_mask, women_mask],
+            [ratio_params["s_n_men"].to_numpy(dtype=float), ratio_params["s_n_women"].to_numpy(dtype=float)],
+            default=1.0,
+        )
+        w_s = np.select(
+            [men_mask, women_mask],
+            [ratio_params["w_s_men"].to_numpy(dtype=float), ratio_params["w_s_women"].to_numpy(dtype=float)],
+            default=1.0,
+        )
+        for j, variable in enumerate(ratio_params["variable"]):
+            new_columns[f"{variable}_s_n"] = s_n[:, j]
+            new_columns[f"{variable}_w_s"] = w_s[:, j]
         
         # Add all new columns to the dataframe at once
-        print("\nAdding demographic factors to dataframe...")
-        df = pd.concat([df, pd.DataFrame(new_columns)], axis=1)
+        print("Adding demographic factors to dataframe...")
+        df = pd.concat([df, pd.DataFrame(new_columns, index=df.index)], axis=1)
         
         # Apply the shock scenario
         scenario_type = shock_scenario.get("scenario_type")
@@ -298,25 +393,17 @@ def run_simulation(config=None):
         average_variables = []
         variable_friendly_names = {}
 
+        # Only consider variables being processed
+        processed_params = parameters_df[parameters_df['variable'].isin(baseline_vars)]
+
         if 'variable_type' in parameters_df.columns:
             print("Loading variable types from 'parameters' sheet.")
-            for _, row in parameters_df.iterrows():
-                var_name = row['variable']
-                var_type = str(row['variable_type']).lower() if pd.notna(row['variable_type']) else ''
-                
-                if var_name not in baseline_vars: # Only consider variables being processed
-                    continue
-
-                if var_type == 'rate':
-                    rate_variables.append(var_name)
-                elif var_type == 'per_capita':
-                    per_capita_variables.append(var_name)
-                elif var_type == 'prevalence':
-                    prevalence_variables.append(var_name)
-                elif var_type == 'average':
-                    average_variables.append(var_name)
-                # else:
-                #     print(f"Warning: Variable '{var_name}' has unknown or missing type '{row['variable_type']}' in 'parameters' sheet.")
+            # Unknown or missing types fall through all four masks and are left unclassified
+            var_types = processed_params['variable_type'].fillna('').astype(str).str.lower()
+            rate_variables = processed_params.loc[var_types == 'rate', 'variable'].tolist()
+            per_capita_variables = processed_params.loc[var_types == 'per_capita', 'variable'].tolist()
+            prevalence_variables = processed_params.loc[var_types == 'prevalence', 'variable'].tolist()
+            average_variables = processed_params.loc[var_types == 'average', 'variable'].tolist()
         else:
             print("Warning: 'variable_type' column not found in 'parameters' sheet. Using hardcoded variable types.")
             # Fallback to hardcoded lists (ensure these are comprehensive or match your old defaults)
@@ -337,14 +424,11 @@ def run_simulation(config=None):
 
         if 'friendly_name' in parameters_df.columns:
             print("Loading friendly names from 'parameters' sheet.")
-            for _, row in parameters_df.iterrows():
-                var_name = row['variable']
-                if var_name not in baseline_vars: # Only consider variables being processed
-                    continue
-                if pd.notna(row['friendly_name']):
-                    variable_friendly_names[var_name] = str(row['friendly_name'])
-                else: # If friendly_name is blank in the sheet, use the variable name itself
-                   variable_friendly_names[var_name] = var_name 
+            # If friendly_name is blank in the sheet, use the variable name itself
+            friendly_names = processed_params['friendly_name'].astype(str).where(
+                processed_params['friendly_name'].notna(), processed_params['variable']
+            )
+            variable_friendly_names = dict(zip(processed_params['variable'], friendly_names))
         else:
             print("Warning: 'friendly_name' column not found in 'parameters' sheet. Using hardcoded friendly names or variable names.")
             # Fallback to hardcoded dictionary
@@ -363,54 +447,85 @@ def run_simulation(config=None):
         
         # --- End of dynamic definitions ---
 
-        # Initialize total population-level variables
-        population_totals = {
-            'total_population_bs': df['population'].sum(),
-            'total_population_as': df['population'].sum(),  # Population is constant in this model
-            'working_age_population_bs': df[df['age'].isin(age_groups_20_64)]['population'].sum(),
-            'working_age_population_as': df[df['age'].isin(age_groups_20_64)]['population'].sum(),
-        }
+        # Scenario shares and population are the same for every variable, so pull
+        # them out once as plain arrays and keep the per-variable math in NumPy
+        s1, s2, s3 = df['s1'].to_numpy(), df['s2'].to_numpy(), df['s3'].to_numpy()
+        s1_as, s2_as, s3_as = df['s1_as'].to_numpy(), df['s2_as'].to_numpy(), df['s3_as'].to_numpy()
+        population = df['population'].to_numpy()
+        # Weight total for the population-weighted averages, summed once for all variables
+        population_total = float(population.sum())
+        
+        # Run the scenario arithmetic for all variables at once on (rows x variables)
+        # matrices; the row-level arrays broadcast across the variable axis
+        values = df[baseline_vars].to_numpy(dtype=float)
+        s_n_all = df[[var + "_s_n" for var in baseline_vars]].to_numpy(dtype=float)
+        w_s_all = df[[var + "_w_s" for var in baseline_vars]].to_numpy(dtype=float)
+        s1_col, s2_col, s3_col = s1[:, None], s2[:, None], s3[:, None]
+        s1_as_col, s2_as_col, s3_as_col = s1_as[:, None], s2_as[:, None], s3_as[:, None]
+        # Zero baselines (e.g. sex-specific cancers) give NaN/inf diff_pct, as with pandas arithmetic
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Calculate the denominators and scenario-adjusted levels
+            denominator_all = s1_col + s2_col * s_n_all + s3_col * s_n_all * w_s_all
+            level_s1_all = values / denominator_all
+            level_s2_all = level_s1_all * s_n_all
+            level_s3_all = level_s2_all * w_s_all
+            # Baseline and alternative scenario value for each demographic group
+            value_bs_all = s1_col * level_s1_all + s2_col * level_s2_all + s3_col * level_s3_all
+            value_as_all = s1_as_col * level_s1_all + s2_as_col * level_s2_all + s3_as_col * level_s3_all
+            value_diff_all = value_as_all - value_bs_all
+            value_diff_pct_all = (value_diff_all / value_bs_all) * 100
+        # Population-weighted sums for every variable in one matrix-vector product each
+        weighted_bs_all = population @ value_bs_all
+        weighted_as_all = population @ value_as_all
         
         print("Processing baseline variables...")
-        # Process each baseline variable
+        # Collect every variable's derived columns, then add them to the dataframe at once
+        all_var_columns = {}
         for i, var in enumerate(baseline_vars):
             # Create a dictionary of new columns for this variable
             var_columns = {}
+            denominator = denominator_all[:, i]
+            level_s1, level_s2, level_s3 = level_s1_all[:, i], level_s2_all[:, i], level_s3_all[:, i]
+            value_bs, value_as = value_bs_all[:, i], value_as_all[:, i]
+            value_diff, value_diff_pct = value_diff_all[:, i], value_diff_pct_all[:, i]
             
-            # Calculate the denominators and scenario-adjusted levels
-            var_columns[var + "_denominator"] = df['s1'] + df['s2'] * df[var + "_s_n"] + df['s3'] * df[var + "_s_n"] * df[var + "_w_s"]
-            var_columns[var + "_s1"] = df[var] / var_columns[var + "_denominator"]
-            var_columns[var + "_s2"] = var_columns[var + "_s1"] * df[var + "_s_n"]
-            var_columns[var + "_s3"] = var_columns[var + "_s2"] * df[var + "_w_s"]            # Baseline and alternative scenario value for each demographic group
-            var_columns[var + "_bs"] = df['s1'] * var_columns[var + "_s1"] + df['s2'] * var_columns[var + "_s2"] + df['s3'] * var_columns[var + "_s3"]
-            var_columns[var + "_as"] = df['s1_as'] * var_columns[var + "_s1"] + df['s2_as'] * var_columns[var + "_s2"] + df['s3_as'] * var_columns[var + "_s3"]
+            var_columns[var + "_denominator"] = denominator
+            var_columns[var + "_s1"] = level_s1
+            var_columns[var + "_s2"] = level_s2
+            var_columns[var + "_s3"] = level_s3
+            var_columns[var + "_bs"] = value_bs
+            var_columns[var + "_as"] = value_as
             
             # For variables representing rates, calculate absolute numbers
             if var in rate_variables or var in prevalence_variables:
-                var_columns[var + "_absolute_bs"] = var_columns[var + "_bs"] * df['population']
-                var_columns[var + "_absolute_as"] = var_columns[var + "_as"] * df['population']
+                var_columns[var + "_absolute_bs"] = value_bs * population
+                var_columns[var + "_absolute_as"] = value_as * population
                 var_columns[var + "_absolute_diff"] = var_columns[var + "_absolute_as"] - var_columns[var + "_absolute_bs"]
             
             # For per capita variables, calculate total impact
             if var in per_capita_variables:
-                var_columns[var + "_total_bs"] = var_columns[var + "_bs"] * df['population']
-                var_columns[var + "_total_as"] = var_columns[var + "_as"] * df['population']
+                var_columns[var + "_total_bs"] = value_bs * population
+                var_columns[var + "_total_as"] = value_as * population
                 var_columns[var + "_total_diff"] = var_columns[var + "_total_as"] - var_columns[var + "_total_bs"]
             
             # Add demographic contribution calculation (which groups contribute most to changes)
-            var_columns[var + "_diff"] = var_columns[var + "_as"] - var_columns[var + "_bs"]
-            var_columns[var + "_diff_pct"] = (var_columns[var + "_diff"] / var_columns[var + "_bs"]) * 100
+            var_columns[var + "_diff"] = value_diff
+            var_columns[var + "_diff_pct"] = value_diff_pct
             
             # Calculate weighted contribution to total change 
-            var_columns[var + "_contribution"] = var_columns[var + "_diff"] * df['population']
+            var_columns[var + "_contribution"] = value_diff * population
             
-            # Add these columns to the dataframe all at once
-            df = pd.concat([df, pd.DataFrame(var_columns)], axis=1)
+            all_var_columns.update(var_columns)
+        
+        df = pd.concat([df, pd.DataFrame(all_var_columns, index=df.index)], axis=1)
         
+        # Summarise each baseline variable from its derived columns
+        for i, var in enumerate(baseline_vars):
             # Store overall population-weighted averages
             try:
-                result_bs = np.average(df[var + '_bs'], weights=df['population'])
-                result_as = np.average(df[var + '_as'], weights=df['population'])
+                # Plain float division, so an all-zero population still raises ZeroDivisionError
+                result_bs = float(weighted_bs_all[i]) / population_total
+                result_as = float(weighted_as_all[i]) / population_total
                 
                 # Additional metrics based on variable type
                 result_dict = {
@@ -703,22 +818,25 @@ def run_simulation(config=None):
                     "demographic_impact": {}
                 }
                 
+                # Population-weighted change and baseline per row, summed per group below
+                # (the weighted change is the "_contribution" column computed above)
+                impact_base = df[['age', 'sex', 'population']].assign(
+                    change=df[var + '_contribution'],
+                    baseline=df[var + '_bs'] * df['population']
+                )
+                
                 # Calculate impact by age groups (aggregate across sexes)
-                age_impact = df.groupby('age')[[var + '_diff', var + '_bs']].apply(
-                    lambda x: pd.Series({
-                        'change': (x[var + '_diff'] * df.loc[x.index, 'population']).sum(),
-                        'baseline': (x[var + '_bs'] * df.loc[x.index, 'population']).sum(),
-                        'population': df.loc[x.index, 'population'].sum()
-                    })
+                age_impact = impact_base.groupby('age').agg(
+                    change=('change', 'sum'),
+                    baseline=('baseline', 'sum'),
+                    population=('population', 'sum')
                 ).reset_index()
                 
                 # Calculate impact by sex (aggregate across age groups)
-                sex_impact = df.groupby('sex')[[var + '_diff', var + '_bs']].apply(
-                    lambda x: pd.Series({
-                        'change': (x[var + '_diff'] * df.loc[x.index, 'population']).sum(),
-                        'baseline': (x[var + '_bs'] * df.loc[x.index, 'population']).sum(),
-                        'population': df.loc[x.index, 'population'].sum()
-                    })
+                sex_impact = impact_base.groupby('sex').agg(
+                    change=('change', 'sum'),
+                    baseline=('baseline', 'sum'),
+                    population=('population', 'sum')
                 ).reset_index()
                 
                 # Add demographic breakdowns to the report
@@ -884,11 +1002,11 @@ def run_simulation(config=None):
         
         # Save results to Excel files
         print(f"Saving summary results to {output_file}...")
-        detailed_summary_df.to_excel(output_file, index=False)
+        detailed_summary_df.to_excel(output_file, index=False, engine='xlsxwriter')
         
         print(f"Saving detailed results to {detailed_output_file}...")
         # Save the entire dataframe with all calculated columns
-        with pd.ExcelWriter(detailed_output_file, engine='openpyxl') as writer:
+        with pd.ExcelWriter(detailed_output_file, engine='xlsxwriter') as writer:
             # Save the summary results
             summary_df.to_excel(writer, sheet_name='Summary', index=False)
             
@@ -39,13 +39,11 @@ def load_config():
         config_path = os.path.join(parent_dir, "config.json")
         
         if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
+            config = simulation2.read_config_file(config_path)
             st.sidebar.success(f"Loaded configuration from {config_path}")
             return config
         elif os.path.exists("config.json"):
-            with open("config.json", 'r') as f:
-                config = json.load(f)
+            config = simulation2.read_config_file("config.json")
             return config
         else:
             st.sidebar.warning("Configuration file not found. Using default settings.")
@@ -124,7 +122,9 @@ def run_visualization(config):
             detailed_output_file_path = resolve_path(detailed_output_file)
             
             summary_df = pd.read_excel(output_file_path)
-            detailed_df = pd.read_excel(detailed_output_file_path, sheet_name='Summary')
+            # Open the detailed workbook once and parse each sheet from it
+            detailed_xls = pd.ExcelFile(detailed_output_file_path)
+            detailed_df = detailed_xls.parse('Summary')
             
             # Run basic visualizations
             visualize_results.visualize_summary(summary_df, config)
@@ -134,8 +134,7 @@ def run_visualization(config):
                 var = row['variable']
                 try:
                     # Read the variable-specific sheet from the detailed output
-                    var_df = pd.read_excel(config.get("simulation", {}).get("detailed_output_file", "DetailedOutput.xlsx"), 
-                                          sheet_name=var[:30])  # Sheet names limited to 30 chars
+                    var_df = detailed_xls.parse(var[:30])  # Sheet names limited to 30 chars
                     visualize_results.visualize_detailed(var_df, var, output_folder)
                 except Exception as var_e:
                     st.warning(f"Could not create detailed visualization for {var}: {str(var_e)}")
@@ -277,11 +276,12 @@ def main():
             
             # Show detailed results
             st.subheader("Detailed Results")
-            sheet_names = pd.ExcelFile(detailed_output_file).sheet_names
+            detailed_xls = pd.ExcelFile(detailed_output_file)
+            sheet_names = detailed_xls.sheet_names
             selected_sheet = st.selectbox("Select Variable Sheet", options=sheet_names)
             
             if selected_sheet:
-                detailed_df = pd.read_excel(detailed_output_file, sheet_name=selected_sheet)
+                detailed_df = detailed_xls.parse(selected_sheet)
                 st.dataframe(detailed_df)
         except Exception as e:
             st.info(f"No results found. Please run a simulation first. Error: {str(e)}")
@@ -8,7 +8,6 @@ import streamlit as st
 import pandas as pd
 # import numpy as np # No longer directly used in this simplified version
 import os
-import json
 import sys
 import openpyxl
 
@@ -33,13 +32,11 @@ def load_config():
         config_path = os.path.join(parent_dir, "config.json")
         
         if os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = json.load(f)
+            config = simulation2.read_config_file(config_path)
             st.sidebar.success(f"Loaded configuration from {config_path}")
             return config
         elif os.path.exists("config.json"): # Fallback to current dir, though parent_dir should be preferred
-            with open("config.json", 'r') as f:
-                config = json.load(f)
+            config = simulation2.read_config_file("config.json")
             return config
         else:
             st.sidebar.warning("Configuration file not found. Using default settings.")